@@ -6,17 +6,24 @@ Processes one video file per run and rotates WireGuard configurations
 
 import os
 import sys
+import atexit
 import logging
 import subprocess
 import time
 import json
+import re
 import glob
 import random
 import shutil
 import socket
+import threading
+import mmap
+import functools
 from pathlib import Path
-from typing import Optional, List, Dict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+from typing import Optional, List, Dict, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 import psutil
 import requests
 from requests.adapters import HTTPAdapter
@@ -26,37 +33,126 @@ from vk_api.exceptions import VkApiError
 
 # Custom rotating log handler that writes to top of file
 class TopRotatingFileHandler(logging.Handler):
-    """Log handler that keeps only the most recent N lines, newest at top"""
+    """Log handler that keeps only the most recent N lines, newest at top
 
-    def __init__(self, filename, max_lines=1000):
+    Records are appended to a small "<filename>.head" file and merged into the
+    main file (newest first, capped at max_lines) every compact_every records,
+    on the first record at least compact_interval seconds after the last merge,
+    and when the handler is closed. A background thread also merges pending records
+    every compact_interval seconds, so the main file never lags by more than that
+    even when the process goes quiet or is killed.
+    """
+
+    def __init__(self, filename, max_lines=1000, compact_every=None, compact_interval=5.0):
         super().__init__()
         self.filename = filename
+        self.head_filename = filename + '.head'
         self.max_lines = max_lines
-        self.lock = None
+        self.compact_every = compact_every or max(1, max_lines // 10)
+        self.compact_interval = compact_interval
+        self._last_compact = time.monotonic()
+        self._head_records: List[int] = []  # Line count of each record in the head file
+        self._head_fd = None  # Opened on first emit and kept for the handler's lifetime
+        self._flush_thread = None  # Started on first emit
+        self._stop_flush = threading.Event()
+
+    def _get_head_fd(self) -> int:
+        if self._head_fd is None:
+            self._head_fd = os.open(self.head_filename, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._head_fd
 
     def emit(self, record):
         try:
             msg = self.format(record)
 
-            # Read existing lines
-            existing_lines = []
-            if os.path.exists(self.filename):
-                try:
-                    with open(self.filename, 'r') as f:
-                        existing_lines = f.readlines()
-                except Exception:
-                    existing_lines = []
+            # Append only - the expensive reorder happens in compact()
+            os.write(self._get_head_fd(), (msg + '\n').encode('utf-8'))
+            self._head_records.append(msg.count('\n') + 1)
+            if self._flush_thread is None:
+                self._flush_thread = threading.Thread(
+                    target=self._flush_loop, name="log-compact", daemon=True)
+                self._flush_thread.start()
 
-            # Write new line at top, keep only max_lines
-            with open(self.filename, 'w') as f:
-                f.write(msg + '\n')
-                # Keep existing lines but limit to max_lines - 1
-                for line in existing_lines[:self.max_lines - 1]:
-                    f.write(line)
+            # Merge by count, or by age so a quiet process still shows recent lines
+            if (len(self._head_records) >= self.compact_every
+                    or time.monotonic() - self._last_compact >= self.compact_interval):
+                self.compact()
 
         except Exception:
             self.handleError(record)
 
+    def _flush_loop(self):
+        """Merge records left in the head file after a quiet compact_interval"""
+        while not self._stop_flush.wait(self.compact_interval):
+            if self._head_records and not self._stop_flush.is_set():
+                try:
+                    self.compact()
+                except Exception:
+                    pass  # Retried on the next tick; emit() reports write errors itself
+
+    def compact(self):
+        """Merge the head file into the main file, newest record first"""
+        self.acquire()
+        try:
+            self._last_compact = time.monotonic()
+            head_fd = self._get_head_fd()
+            head_size = os.fstat(head_fd).st_size
+            head_text = os.pread(head_fd, head_size, 0).decode('utf-8', errors='replace') if head_size else ''
+            head_lines = [line + '\n' for line in head_text.split('\n')]
+            if head_lines[-1] == '\n':
+                head_lines.pop()  # Nothing after the final newline
+
+            if not head_lines:
+                self._head_records = []
+                return
+
+            # Split head lines back into records so multi-line messages keep their order.
+            # Lines left over from a previous process come first, one record each.
+            leftover = len(head_lines) - sum(self._head_records)
+            if leftover < 0:
+                leftover = len(head_lines)
+                self._head_records = []
+            records = [[line] for line in head_lines[:leftover]]
+            pos = leftover
+            for count in self._head_records:
+                records.append(head_lines[pos:pos + count])
+                pos += count
+
+            # Read existing lines
+            try:
+                with open(self.filename, 'r', encoding='utf-8', errors='replace') as f:
+                    existing_lines = f.readlines()
+            except Exception:
+                existing_lines = []
+
+            new_lines = [line for lines in reversed(records) for line in lines]
+            new_lines.extend(existing_lines)
+
+            # Write to a temp file and swap it in so readers never see a partial log
+            tmp_filename = self.filename + '.tmp'
+            with open(tmp_filename, 'w', encoding='utf-8') as f:
+                f.writelines(new_lines[:self.max_lines])
+            os.replace(tmp_filename, self.filename)
+            os.ftruncate(head_fd, 0)  # O_APPEND writes continue from the new end
+            self._head_records = []
+        finally:
+            self.release()
+
+    def close(self):
+        self._stop_flush.set()
+        self.acquire()
+        try:
+            try:
+                self.compact()
+            except Exception:
+                pass
+            if self._head_fd is not None:
+                os.close(self._head_fd)
+                self._head_fd = None
+        finally:
+            self.release()
+        super().close()
+
 # Configure logging
 log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
 max_log_lines = int(os.getenv('MAX_LOG_LINES', '1000'))
@@ -75,9 +171,14 @@ logger.addHandler(file_handler)
 logger.addHandler(console_handler)
 
 
-def _keepalive_socket_options() -> List[tuple]:
-    """Return socket options that enable TCP keepalive with sane defaults."""
-    options: List[tuple] = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+@functools.lru_cache(maxsize=1)
+def _keepalive_socket_options() -> Tuple[tuple, ...]:
+    """Return socket options that enable TCP keepalive with sane defaults (computed once)."""
+    # TCP_NODELAY is urllib3's default; keep it since these options replace the defaults
+    options: List[tuple] = [
+        (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    ]
 
     # Linux-specific keepalive settings
     if hasattr(socket, "TCP_KEEPIDLE"):
@@ -92,83 +193,142 @@ def _keepalive_socket_options() -> List[tuple]:
     if hasattr(socket, "TCP_KEEPCNT"):
         options.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 5))
 
-    return options
+    if hasattr(socket, "TCP_USER_TIMEOUT"):
+        # Linux: drop the connection once sent data stays unacknowledged for 30s,
+        # instead of waiting out the full keepalive probe cycle on a dead tunnel
+        options.append((socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, 30_000))
 
+    return tuple(options)
 
-class KeepAliveAdapter(HTTPAdapter):
-    """HTTP adapter that enables TCP keepalive and retry logic for large uploads."""
 
-    def __init__(self, *args, **kwargs):
-        self._keepalive_options = kwargs.pop("socket_options", None) or _keepalive_socket_options()
+# Video file extensions picked up by find_video_file (compared lowercased)
+_VIDEO_EXTS = frozenset({'.mp4', '.avi', '.mkv', '.mov', '.flv', '.wmv', '.webm'})
+
+# Appended to a video's file name for its "uploaded" marker (the host scripts check it too)
+_UPLOADED_MARKER_SUFFIX = '.uploaded'
+
+# Last byte of the received range in an upload status "Range: bytes=0-12345" header
+_RANGE_RE = re.compile(r'bytes=\s*\d+-(\d+)')
+
+
+def _backoff(attempt: int, base: float = 5, cap: float = 120) -> float:
+    """Exponential backoff delay in seconds for a 0-based attempt, with up to `base` of jitter"""
+    return min(cap, base * (2 ** attempt)) + random.uniform(0, base)
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTP adapter that enables TCP keepalive and retry logic for large uploads.
+
+    pool_timeout bounds how long a request waits for a free connection when the
+    pool blocks (requests itself never passes one, so the wait is otherwise unbounded).
+    """
+
+    def __init__(self, *args, pool_timeout: Optional[float] = None, **kwargs):
+        self._pool_timeout = pool_timeout
+        options = kwargs.pop("socket_options", None) or _keepalive_socket_options()
+        # One entry per (level, optname); the last value given wins
+        self._keepalive_options = tuple({(level, name): (level, name, value)
+                                         for level, name, value in options}.values())
         super().__init__(*args, **kwargs)
 
     def _merge_socket_options(self, existing: Optional[List[tuple]]) -> List[tuple]:
-        merged: List[tuple] = list(existing) if existing else []
-        for option in self._keepalive_options:
-            if option not in merged:
-                merged.append(option)
-        return merged
+        if not existing:
+            return list(self._keepalive_options)
+        seen = {(option[0], option[1]) for option in existing}
+        return list(existing) + [option for option in self._keepalive_options
+                                 if (option[0], option[1]) not in seen]
+
+    def _apply_pool_timeout(self, manager):
+        """Make the manager's connection pools default to self._pool_timeout"""
+        if self._pool_timeout is None or getattr(manager, "_bounded_pool_wait", False):
+            return  # Proxy managers are cached and come back through proxy_manager_for
+        manager._bounded_pool_wait = True
+        pool_timeout = self._pool_timeout
+
+        def bounded(pool_cls):
+            class BoundedWaitPool(pool_cls):
+                def urlopen(self, *args, **kwargs):
+                    if kwargs.get("pool_timeout") is None:
+                        kwargs["pool_timeout"] = pool_timeout
+                    return super().urlopen(*args, **kwargs)
+            return BoundedWaitPool
+
+        manager.pool_classes_by_scheme = {scheme: bounded(pool_cls)
+                                          for scheme, pool_cls in manager.pool_classes_by_scheme.items()}
 
     def init_poolmanager(self, *args, **kwargs):
         kwargs["socket_options"] = self._merge_socket_options(kwargs.get("socket_options"))
         super().init_poolmanager(*args, **kwargs)
+        self._apply_pool_timeout(self.poolmanager)
 
     def proxy_manager_for(self, *args, **kwargs):
         kwargs["socket_options"] = self._merge_socket_options(kwargs.get("socket_options"))
-        return super().proxy_manager_for(*args, **kwargs)
+        manager = super().proxy_manager_for(*args, **kwargs)
+        self._apply_pool_timeout(manager)
+        return manager
 
 
 class IncompleteUploadError(Exception):
     """Raised when the remote upload completes before all bytes are sent."""
 
+    def __init__(self, message: str, consecutive_timeouts: bool = False):
+        super().__init__(message)
+        # Set when chunks kept failing in a row (usually the VPN or route to the CDN)
+        self.consecutive_timeouts = consecutive_timeouts
+
 
 class NetworkTrafficMonitor:
     """Monitor network traffic during upload"""
     
     def __init__(self):
         self.start_bytes = 0
-        self.interface = self.get_active_interface()
-    
+        self.interface: Optional[str] = None  # Resolved by start_monitoring(), once the tunnel is up
+        self._use_pernic = True  # Cleared once the interface is missing from per-NIC counters
+
     def get_active_interface(self) -> str:
         """Get the active network interface"""
         try:
-            # Try to find WireGuard interface first
-            for interface in psutil.net_if_stats():
+            # One pass: a WireGuard interface wins, else the first interface that is up
+            fallback = None
+            for interface, stat in psutil.net_if_stats().items():
                 if interface.startswith('wg'):
                     return interface
-            
-            # Fall back to default interface
-            stats = psutil.net_if_stats()
-            for interface, stat in stats.items():
-                if stat.isup and interface != 'lo':
-                    return interface
+                if fallback is None and stat.isup and interface != 'lo':
+                    fallback = interface
+            if fallback is not None:
+                return fallback
         except Exception as e:
             logger.warning(f"Could not determine network interface: {e}")
         
         return 'eth0'  # Default fallback
     
+    def _bytes_sent(self) -> int:
+        """Read bytes sent on the monitored interface"""
+        if self._use_pernic:
+            stats = psutil.net_io_counters(pernic=True)
+            if self.interface in stats:
+                return stats[self.interface].bytes_sent
+            # Use total if specific interface not found (and skip the per-NIC scan from now on)
+            self._use_pernic = False
+        return psutil.net_io_counters().bytes_sent
+
     def start_monitoring(self):
         """Start monitoring network traffic"""
         try:
-            stats = psutil.net_io_counters(pernic=True)
-            if self.interface in stats:
-                self.start_bytes = stats[self.interface].bytes_sent
-            else:
-                # Use total if specific interface not found
-                self.start_bytes = psutil.net_io_counters().bytes_sent
+            # Picked per attempt: the tunnel may have come up or been rotated since the last one
+            interface = self.get_active_interface()
+            if interface != self.interface:
+                self.interface = interface
+                self._use_pernic = True
+            self.start_bytes = self._bytes_sent()
         except Exception as e:
             logger.warning(f"Could not start traffic monitoring: {e}")
             self.start_bytes = 0
-    
+
     def get_upload_bytes(self) -> int:
         """Get bytes uploaded since monitoring started"""
         try:
-            stats = psutil.net_io_counters(pernic=True)
-            if self.interface in stats:
-                current_bytes = stats[self.interface].bytes_sent
-            else:
-                current_bytes = psutil.net_io_counters().bytes_sent
-            
+            current_bytes = self._bytes_sent()
             return max(0, current_bytes - self.start_bytes)
         except Exception as e:
             logger.warning(f"Could not get traffic stats: {e}")
@@ -181,10 +341,30 @@ class WireGuardManager:
         self.wg_dir = Path(wg_dir)
         self.current_config = None
         self.last_config_file = Path("/app/logs/last_wg_conf.txt")
-    
+        self._configs_cache: Optional[List[Path]] = None
+        self._configs_mtime = None  # wg_dir mtime the cache was built from
+        self._config_index: Dict[Path, int] = {}  # config path -> position in the cached list
+
     def get_available_configs(self) -> List[Path]:
-        """Get list of available WireGuard configuration files"""
-        configs = list(self.wg_dir.glob("*.conf"))
+        """Get sorted list of available WireGuard configuration files
+
+        The directory is only rescanned when its mtime changes (a config added or removed).
+        """
+        try:
+            mtime = self.wg_dir.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if self._configs_cache is None or mtime is None or mtime != self._configs_mtime:
+            try:
+                # Plain suffix check on one readdir instead of glob's pattern matching
+                self._configs_cache = sorted(path for path in self.wg_dir.iterdir() if path.suffix == ".conf")
+            except OSError:
+                self._configs_cache = []  # Missing or unreadable directory
+            self._configs_mtime = mtime
+            self._config_index = {path: i for i, path in enumerate(self._configs_cache)}
+
+        configs = self._configs_cache
         if not configs:
             logger.warning(f"No WireGuard configs found in {self.wg_dir}")
         return configs
@@ -205,44 +385,62 @@ class WireGuardManager:
         if not configs:
             return None
 
-        # Read last used config
-        last_config = None
-        if self.last_config_file.exists():
+        # Last used config: the one connected in this process, else the previous run's record
+        last_path = self.current_config
+        if last_path is None and self.last_config_file.exists():
             try:
                 last_config = self.last_config_file.read_text().strip()
+                if last_config:
+                    last_path = Path(last_config)
             except Exception as e:
                 logger.warning(f"Could not read last config file: {e}")
 
         # Find next config (simple rotation)
-        if last_config:
-            try:
-                last_path = Path(last_config)
-                last_index = configs.index(last_path)
-                next_index = (last_index + 1) % len(configs)
-                return configs[next_index]
-            except (ValueError, IndexError):
-                pass
+        if last_path is not None:
+            last_index = self._config_index.get(last_path)
+            if last_index is not None:
+                return configs[(last_index + 1) % len(configs)]
 
         # Return first config or random if last not found
         return configs[0]
     
+    def _wg_show(self) -> Optional[Dict[str, str]]:
+        """Run `wg show` once and return its output indexed by interface (None on failure)"""
+        result = subprocess.run(["sudo", "wg", "show"], capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        return self._parse_wg_show(result.stdout)
+
+    @staticmethod
+    def _parse_wg_show(output: str) -> Dict[str, str]:
+        """Split `wg show` output into {interface: block}; peer sections stay with their interface"""
+        blocks: Dict[str, List[str]] = {}
+        current = None
+        for line in output.splitlines():
+            if line.startswith("interface:"):
+                current = line.split(":", 1)[1].strip()
+                blocks[current] = []
+            if current is not None:
+                blocks[current].append(line)
+        return {name: "\n".join(lines).strip() for name, lines in blocks.items()}
+
     def connect_wireguard(self, config_path: Path) -> bool:
         """Connect to WireGuard using specified config"""
         try:
             # Check if this config is already connected
             config_name = config_path.stem  # e.g., "wg0" from "wg0.conf"
 
-            # Check active WireGuard interfaces
-            check_result = subprocess.run(["sudo", "wg", "show"], capture_output=True, text=True)
-            if check_result.returncode == 0 and config_name in check_result.stdout:
+            # Check active WireGuard interfaces (reused below instead of re-running wg show)
+            active = self._wg_show()
+            if active is not None and config_name in active:
                 logger.info(f"WireGuard {config_name} already connected, using existing connection")
                 self.current_config = config_path
                 self.last_config_file.write_text(str(config_path))
-                self.log_connection_info()
+                self.log_connection_info(status=active)
                 return True
 
             # Disconnect any existing WG connections
-            self.disconnect_wireguard()
+            self.disconnect_wireguard(active=active or {})
 
             # Connect with new config
             cmd = ["sudo", "wg-quick", "up", str(config_path)]
@@ -269,31 +467,49 @@ class WireGuardManager:
             logger.error(f"Error connecting WireGuard: {e}")
             return False
     
-    def disconnect_wireguard(self):
-        """Disconnect all WireGuard connections"""
+    def disconnect_wireguard(self, active: Optional[Dict[str, str]] = None):
+        """Disconnect all WireGuard connections
+
+        Args:
+            active: Interfaces from a `wg show` the caller already ran; queried if omitted
+        """
         try:
             # Get list of active WG interfaces
-            result = subprocess.run(["sudo", "wg", "show"], capture_output=True, text=True)
-            if result.returncode == 0 and result.stdout.strip():
-                interfaces = []
-                for line in result.stdout.split('\n'):
-                    if line and not line.startswith(' '):
-                        interface = line.split(':')[0]
-                        interfaces.append(interface)
-                
-                # Disconnect each interface
-                for interface in interfaces:
-                    subprocess.run(["sudo", "wg-quick", "down", interface], 
-                                 capture_output=True, timeout=10)
-                    logger.info(f"Disconnected WireGuard interface: {interface}")
+            if active is None:
+                active = self._wg_show() or {}
+
+            # Disconnect each interface
+            for interface in active:
+                subprocess.run(["sudo", "wg-quick", "down", interface], 
+                             capture_output=True, timeout=10)
+                logger.info(f"Disconnected WireGuard interface: {interface}")
                     
         except Exception as e:
             logger.warning(f"Error disconnecting WireGuard: {e}")
     
-    def log_connection_info(self):
-        """Log current connection information (optional, non-critical)"""
+    def log_connection_info(self, status: Optional[Dict[str, str]] = None):
+        """Log current connection information (optional, non-critical)
+
+        The public IP lookup runs on a background thread so it never delays the upload.
+
+        Args:
+            status: Parsed `wg show` output to log; queried if omitted
+        """
+        threading.Thread(target=self._log_public_ip, name="public-ip", daemon=True).start()
+
+        try:
+            # Log WireGuard status
+            if status is None:
+                status = self._wg_show()
+            if status is not None:
+                wg_status = "\n\n".join(status.values())
+                logger.info(f"WireGuard status: {wg_status}")
+        except Exception as e:
+            logger.debug(f"Could not log connection info: {e}")
+
+    def _log_public_ip(self):
+        """Look up and log the public IP the tunnel exposes"""
         try:
-            # Get public IP with longer timeout and fewer retries
             response = requests.get("https://api.ipify.org?format=json", timeout=5)
             response.raise_for_status()
 
@@ -304,11 +520,6 @@ class WireGuardManager:
             except json.JSONDecodeError as e:
                 logger.debug(f"Could not parse IP response: {e}")
 
-            # Log WireGuard status
-            result = subprocess.run(["sudo", "wg", "show"], capture_output=True, text=True)
-            if result.returncode == 0:
-                logger.info(f"WireGuard status: {result.stdout.strip()}")
-
         except requests.Timeout:
             logger.debug(f"IP check timed out (skipping, non-critical)")
         except requests.RequestException as e:
@@ -319,19 +530,45 @@ class WireGuardManager:
 class VKUploader:
     """Handle VK video uploads with playlist support"""
 
+    # Default number of chunks uploaded in parallel (PARALLEL_WORKERS overrides it);
+    # the upload connection pool is sized to match
+    MAX_CHUNK_WORKERS = 3
+
+    # How upload_video handles a failed attempt, checked in order (first isinstance match wins):
+    # (exception type, backoff base in seconds, log prefix, failure reason template)
+    RETRY_POLICY = (
+        (VkApiError, 5, "VK API error", "VK API error: {error}"),
+        (requests.Timeout, 10, "Upload timeout", "Upload timeout after {max_retries} attempts"),
+        (IncompleteUploadError, 15, "Incomplete upload", "Incomplete upload: {error}"),  # Longer wait for connection issues
+        (requests.RequestException, 5, "Upload error", "Network error: {error}"),
+        (Exception, 5, "Unexpected error during upload", "Unexpected error: {error}"),
+    )
+
+    # Chunk size adapts to measured throughput within these bounds (widened to include
+    # the configured size), aiming for chunks that take about CHUNK_TARGET_SECONDS to send
+    MIN_CHUNK_SIZE = 1 * 1024 * 1024
+    MAX_CHUNK_SIZE = 16 * 1024 * 1024
+    CHUNK_TARGET_SECONDS = 5
+
     def __init__(self, token: str, wg_manager=None, skip_vpn=False):
         self.token = token
         self.vk_session = VkApi(token=token)
+        # TCP keepalive for VK API calls too: the connection sits idle for the length of an upload
+        self.vk_session.http.mount("https://", KeepAliveAdapter())
         self.traffic_monitor = NetworkTrafficMonitor()
         self.chunk_size = self._determine_chunk_size()
+        self.chunk_workers = self._determine_chunk_workers()
         self.upload_session = self._create_upload_session()
-        self._playlists_cache = None  # Cache playlists to avoid repeated API calls
+        self._playlists_cache: Dict[str, int] = {}  # Cache playlists to avoid repeated API calls
+        self._playlists_loaded = False  # Set once video.getAlbums has been tried
         self.last_failure_reason = None  # Track last upload failure reason
         self.wg_manager = wg_manager  # Optional WireGuard manager for VPN rotation
         self.skip_vpn = skip_vpn  # If True, use max performance (no VPN throttling)
+        self._executors: Dict[int, ThreadPoolExecutor] = {}  # Chunk upload pools, reused across attempts
+        self._probed_hosts = set()  # Upload hosts connectivity-tested over the current tunnel
 
     def _determine_chunk_size(self) -> int:
-        """Determine upload chunk size (defaults to 5 MB for better throughput)."""
+        """Determine the starting upload chunk size (defaults to 5 MB; adapted during uploads)."""
         env_value = os.getenv("UPLOAD_CHUNK_SIZE_MB")
         if env_value:
             try:
@@ -346,6 +583,39 @@ class VKUploader:
         # Increased default from 1 MB to 5 MB for better throughput with parallel uploads
         return 5 * 1024 * 1024
 
+    def _determine_chunk_workers(self) -> int:
+        """Determine how many chunks to upload in parallel (PARALLEL_WORKERS, default 3)."""
+        env_value = os.getenv("PARALLEL_WORKERS")
+        if env_value:
+            try:
+                workers = int(env_value)
+                if workers > 0:
+                    if workers != self.MAX_CHUNK_WORKERS:
+                        logger.info(f"Using custom parallel upload workers: {workers}")
+                    return workers
+                logger.warning(f"PARALLEL_WORKERS must be positive; falling back to {self.MAX_CHUNK_WORKERS}")
+            except ValueError:
+                logger.warning(f"Invalid PARALLEL_WORKERS value; falling back to {self.MAX_CHUNK_WORKERS}")
+        return self.MAX_CHUNK_WORKERS
+
+    @staticmethod
+    def _chunk_timeout(chunk_size: int) -> int:
+        """Read timeout for one chunk: 3 seconds per MB + 30 second base, at least 90 seconds"""
+        return max(90, int((chunk_size / (1024 * 1024)) * 3) + 30)
+
+    def _adapt_chunk_size(self, current: int, speed: float, failed: bool = False) -> int:
+        """Return the size for the next chunks given the smoothed per-connection speed (bytes/s)
+
+        Failures halve the size; a link fast enough to send twice the current size within
+        CHUNK_TARGET_SECONDS doubles it.
+        """
+        if failed:
+            return max(min(self.MIN_CHUNK_SIZE, self.chunk_size), current // 2)
+        upper = max(self.MAX_CHUNK_SIZE, self.chunk_size)
+        if current < upper and speed * self.CHUNK_TARGET_SECONDS >= current * 2:
+            return min(upper, current * 2)
+        return current
+
     def _create_upload_session(self) -> requests.Session:
         """Create a requests session with retries and TCP keepalive enabled."""
         retry = Retry(
@@ -357,30 +627,54 @@ class VKUploader:
             allowed_methods=False,
             respect_retry_after_header=True,
         )
-        # Increased pool size for parallel uploads
-        adapter = KeepAliveAdapter(max_retries=retry, pool_maxsize=10, pool_block=False)
+        # One pooled connection per chunk worker; blocking makes workers reuse them
+        # instead of opening (and discarding) extra connections. The wait for a free one
+        # is bounded (a leaked connection would otherwise hang every later chunk) and fails
+        # the chunk into the normal retry path
+        adapter = KeepAliveAdapter(
+            max_retries=retry,
+            pool_connections=4,
+            pool_maxsize=self.chunk_workers,
+            pool_block=True,
+            pool_timeout=self._chunk_timeout(self.chunk_size),
+        )
         session = requests.Session()
         session.mount("https://", adapter)
         session.mount("http://", adapter)
         session.headers.update({"Connection": "keep-alive"})
         return session
 
+    def _get_executor(self, max_workers: int) -> ThreadPoolExecutor:
+        """Return a chunk upload pool with max_workers threads, creating it on first use"""
+        executor = self._executors.get(max_workers)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vk-upload")
+            atexit.register(executor.shutdown, wait=False, cancel_futures=True)
+            self._executors[max_workers] = executor
+        return executor
+
+    def close(self):
+        """Shut down chunk upload pools and close pooled upload connections"""
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors.clear()
+        self.upload_session.close()
+
     def get_playlists(self) -> Dict[str, int]:
         """Get all video playlists (albums) from VK, with caching"""
-        if self._playlists_cache is not None:
+        if self._playlists_loaded:
             return self._playlists_cache
 
+        self._playlists_loaded = True
         try:
             response = self.vk_session.method("video.getAlbums")
-            if not isinstance(response, dict) or "items" not in response:
+            items = response.get("items") if isinstance(response, dict) else None
+            if items is None:
                 logger.warning(f"Unexpected response from video.getAlbums: {response}")
-                self._playlists_cache = {}
-                return {}
+                return self._playlists_cache
 
-            playlists = {}
-            for item in response["items"]:
-                if "title" in item and "id" in item:
-                    playlists[item["title"]] = item["id"]
+            playlists = {item["title"]: item["id"] for item in items
+                         if "title" in item and "id" in item}
 
             self._playlists_cache = playlists
             logger.debug(f"Loaded {len(playlists)} playlists from VK")
@@ -388,12 +682,10 @@ class VKUploader:
 
         except VkApiError as e:
             logger.error(f"VK API error getting playlists: {e}")
-            self._playlists_cache = {}
-            return {}
+            return self._playlists_cache
         except Exception as e:
             logger.error(f"Error getting playlists: {e}")
-            self._playlists_cache = {}
-            return {}
+            return self._playlists_cache
 
     def create_playlist(self, title: str) -> Optional[int]:
         """Create a new VK video playlist (album)"""
@@ -414,8 +706,6 @@ class VKUploader:
 
             if playlist_id:
                 # Update cache
-                if self._playlists_cache is None:
-                    self._playlists_cache = {}
                 self._playlists_cache[title] = playlist_id
                 logger.info(f"Created playlist '{title}' with ID {playlist_id}")
                 return playlist_id
@@ -442,95 +732,84 @@ class VKUploader:
     
     def find_video_file(self, directory: str) -> Optional[Path]:
         """Find the first valid video file in directory that hasn't been uploaded (not tagged blue)"""
-        video_extensions = {'.mp4', '.avi', '.mkv', '.mov', '.flv', '.wmv', '.webm'}
-
         directory_path = Path(directory)
         if not directory_path.exists():
             logger.error(f"Directory does not exist: {directory}")
             return None
 
-        # Find all video files
-        video_files = []
-        for ext in video_extensions:
-            video_files.extend(directory_path.glob(f"**/*{ext}"))
-            video_files.extend(directory_path.glob(f"**/*{ext.upper()}"))
+        # Single walk over the tree (sorted for a stable pick order), stopping at the
+        # first video file that is NOT tagged blue (i.e., not yet uploaded)
+        found_videos = False
+        for root, dirs, files in os.walk(directory_path):
+            dirs.sort()
+            # Upload markers sit next to their video, so this listing tells
+            # uploaded files apart without a stat per candidate
+            names = set(files)
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() not in _VIDEO_EXTS:
+                    continue
+                found_videos = True
+                if name + _UPLOADED_MARKER_SUFFIX not in names:
+                    video_file = Path(root) / name
+                    logger.info(f"Found untagged video file: {video_file}")
+                    return video_file
 
-        if not video_files:
+        if not found_videos:
             logger.warning(f"No video files found in {directory}")
             return None
 
-        # Find first video file that is NOT tagged blue (i.e., not yet uploaded)
-        for video_file in video_files:
-            if not self.is_file_tagged_blue(video_file):
-                logger.info(f"Found untagged video file: {video_file}")
-                return video_file
-
         logger.info("All video files are already tagged blue (uploaded)")
         return None
     
-    def _check_upload_status(self, upload_url: str) -> int:
-        """Check the upload status and return the last known byte"""
+    def _check_upload_status(self, upload_url: str) -> Optional[int]:
+        """Check the upload status and return the last known byte (None if the check failed)"""
         try:
-            response = self.upload_session.get(upload_url, timeout=30)
+            # Fail fast: a status probe that hangs means the connection is dead anyway
+            response = self.upload_session.get(upload_url, timeout=(5, 10))
             response.raise_for_status()
 
             # Parse the Range header or X-Last-Known-Byte header
             last_byte = 0
-            if 'Range' in response.headers:
-                # Format: bytes=0-12345
-                range_header = response.headers['Range']
-                if 'bytes=' in range_header:
-                    parts = range_header.replace('bytes=', '').split('-')
-                    if len(parts) == 2 and parts[1]:
-                        last_byte = int(parts[1]) + 1  # Range is inclusive, so add 1
+            range_match = _RANGE_RE.search(response.headers.get('Range', ''))
+            if range_match:
+                last_byte = int(range_match.group(1)) + 1  # Range is inclusive, so add 1
             elif 'X-Last-Known-Byte' in response.headers:
                 last_byte = int(response.headers['X-Last-Known-Byte'])
 
-            logger.debug(f"Upload status check: last known byte = {last_byte}")
+            logger.debug("Upload status check: last known byte = %d", last_byte)
             return last_byte
         except Exception as e:
             logger.warning(f"Could not check upload status: {e}")
-            return 0
-
-    def _read_chunk(self, video_path: Path, start_byte: int, chunk_size: int) -> bytes:
-        """Read a chunk from file at specific offset"""
-        with open(video_path, 'rb') as f:
-            f.seek(start_byte)
-            return f.read(chunk_size)
+            return None
 
-    def _upload_chunk(self, upload_url: str, video_path: Path, start_byte: int,
-                     chunk_size: int, total_size: int, filename: str, timeout: int,
-                     preloaded_data: bytes = None) -> tuple[bool, int]:
+    def _upload_chunk(self, upload_url: str, chunk_data: memoryview, start_byte: int,
+                     total_size: int, base_headers: Dict[str, str], timeout: int) -> tuple[bool, int, float]:
         """
         Upload a single chunk of the file.
-        If preloaded_data is provided, use it; otherwise read from disk on-demand.
-        Returns (success, bytes_uploaded)
+        chunk_data is the chunk's slice of the memory-mapped file, sent without copying.
+        base_headers holds the per-video headers; only the range headers are added per chunk.
+        Returns (success, bytes_uploaded, seconds spent sending and awaiting the response)
         """
         try:
-            # Use preloaded data if available, otherwise read on-demand
-            if preloaded_data is not None:
-                chunk_data = preloaded_data
-            else:
-                chunk_data = self._read_chunk(video_path, start_byte, chunk_size)
-
             actual_chunk_size = len(chunk_data)
 
             if actual_chunk_size == 0:
                 logger.debug("No data to upload (EOF)")
-                return True, 0
+                return True, 0, 0.0
 
             end_byte = start_byte + actual_chunk_size - 1
 
             # Prepare headers for chunked upload
-            headers = {
-                'Content-Range': f'bytes {start_byte}-{end_byte}/{total_size}',
-                'Content-Type': 'application/octet-stream',
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Content-Length': str(actual_chunk_size)
-            }
+            headers = base_headers.copy()
+            headers['Content-Range'] = f'bytes {start_byte}-{end_byte}/{total_size}'
+            headers['Content-Length'] = str(actual_chunk_size)
 
-            logger.debug(f"Uploading chunk: {start_byte}-{end_byte}/{total_size} ({actual_chunk_size / (1024*1024):.2f} MB)")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Uploading chunk: %d-%d/%d (%.2f MB)",
+                             start_byte, end_byte, total_size, actual_chunk_size / (1024 * 1024))
 
+            # Timed here, in the worker, so the in-order collection of the window is not counted
+            request_started = time.monotonic()
             # Use longer connection timeout for VPN reliability (90s connect, variable read)
             response = self.upload_session.post(
                 upload_url,
@@ -538,27 +817,28 @@ class VKUploader:
                 headers=headers,
                 timeout=(90, timeout)
             )
+            elapsed = time.monotonic() - request_started
 
-            logger.debug(f"Chunk response: status={response.status_code}")
+            logger.debug("Chunk response: status=%d", response.status_code)
 
             # 201 = partial upload in progress, 200 = upload complete
             if response.status_code not in [200, 201]:
-                logger.error(f"Unexpected status code: {response.status_code}")
-                logger.error(f"Response: {response.text[:500]}")
-                return False, 0
+                logger.error("Unexpected status code: %d", response.status_code)
+                logger.error("Response: %s", response.text[:500])
+                return False, 0, elapsed
 
-            return True, actual_chunk_size
+            return True, actual_chunk_size, elapsed
 
         except requests.exceptions.ConnectTimeout as e:
-            logger.error(f"Connection timeout uploading chunk at byte {start_byte}: {e}")
+            logger.error("Connection timeout uploading chunk at byte %d: %s", start_byte, e)
             logger.warning("VPN connection may be unstable or CDN server unreachable")
-            return False, 0
+            return False, 0, 0.0
         except requests.exceptions.Timeout as e:
-            logger.error(f"Timeout uploading chunk at byte {start_byte}: {e}")
-            return False, 0
+            logger.error("Timeout uploading chunk at byte %d: %s", start_byte, e)
+            return False, 0, 0.0
         except Exception as e:
-            logger.error(f"Error uploading chunk at byte {start_byte}: {e}")
-            return False, 0
+            logger.error("Error uploading chunk at byte %d: %s", start_byte, e)
+            return False, 0, 0.0
 
     def upload_video(self, video_path: Path, playlist_id: Optional[int] = None, max_retries: int = 3) -> bool:
         """Upload video to VK using chunked upload with retry logic and parallel uploads
@@ -572,174 +852,240 @@ class VKUploader:
             True if upload successful, False otherwise
         """
 
-        for attempt in range(max_retries):
-            try:
-                # Start traffic monitoring
-                self.traffic_monitor.start_monitoring()
-                start_time = time.time()
-
-                # Get upload URL
-                save_params = {
-                    "name": video_path.stem,
-                    "privacy_view": "only_me",
-                    "privacy_comment": "only_me",
-                    "wallpost": False
-                }
-
-                # Add to playlist if specified
-                if playlist_id is not None:
-                    save_params["album_id"] = playlist_id
-                    logger.info(f"Uploading to playlist ID: {playlist_id}")
-                else:
-                    logger.info("Uploading without playlist (root folder)")
+        # Upload video metadata
+        save_params = {
+            "name": video_path.stem,
+            "privacy_view": "only_me",
+            "privacy_comment": "only_me",
+            "wallpost": False
+        }
+
+        # Add to playlist if specified
+        if playlist_id is not None:
+            save_params["album_id"] = playlist_id
+            logger.info(f"Uploading to playlist ID: {playlist_id}")
+        else:
+            logger.info("Uploading without playlist (root folder)")
+
+        # Headers shared by every chunk of this video
+        base_headers = {
+            'Content-Type': 'application/octet-stream',
+            'Content-Disposition': f'attachment; filename="{video_path.name}"',
+        }
 
-                save_response = self.vk_session.method("video.save", save_params)
+        # The upload URL stays valid across retries, so partial uploads can be resumed
+        upload_url = None
+        confirmed_bytes = 0  # Bytes the server acknowledged in any attempt
 
-                upload_url = save_response["upload_url"]
+        # Adaptive chunking state, kept across attempts
+        current_chunk_size = self.chunk_size
+        speed_ewma = 0.0  # Smoothed per-connection throughput in bytes/s
+
+        for attempt in range(max_retries):
+            try:
                 file_size = video_path.stat().st_size
+                if file_size == 0:
+                    # Nothing to send; never report it as uploaded
+                    logger.error(f"Video file is empty: {video_path.name}")
+                    self.last_failure_reason = "Video file is empty (0 bytes)"
+                    return False
+
+                # Get upload URL (only once per video unless it expires)
+                if upload_url is None:
+                    save_response = self.vk_session.method("video.save", save_params)
+                    upload_url = save_response["upload_url"]
 
                 if attempt > 0:
                     logger.info(f"Retry attempt {attempt + 1}/{max_retries}")
                 logger.info(f"Starting chunked upload of {video_path.name} ({file_size / (1024*1024):.2f} MB)")
-                logger.debug(f"Upload chunk size: {self.chunk_size / (1024 * 1024):.2f} MB")
+                logger.debug(f"Upload chunk size: {current_chunk_size / (1024 * 1024):.2f} MB")
 
-                # Calculate timeout per chunk (optimized for faster uploads)
-                # 3 seconds per MB of chunk + 30 second base (reduced from 5s + 60s)
-                chunk_timeout = max(90, int((self.chunk_size / (1024*1024)) * 3) + 30)
-                logger.info(f"Chunk timeout: {chunk_timeout} seconds")
+                # Timeout per chunk scales with its size (see _chunk_timeout)
+                logger.info(f"Chunk timeout: {self._chunk_timeout(current_chunk_size)} seconds")
 
                 # Check if there's an existing partial upload
                 start_byte = 0
                 if attempt > 0:
-                    start_byte = self._check_upload_status(upload_url)
+                    upload_status = self._check_upload_status(upload_url)
+                    start_byte = upload_status or 0
                     if start_byte > 0:
                         logger.info(f"Resuming upload from byte {start_byte} ({start_byte / (1024*1024):.2f} MB)")
+                    elif upload_status is not None and confirmed_bytes > 0:
+                        # The server no longer knows about bytes it acknowledged: the URL has expired
+                        logger.info("Upload session expired, requesting a new upload URL")
+                        save_response = self.vk_session.method("video.save", save_params)
+                        upload_url = save_response["upload_url"]
+                        confirmed_bytes = 0
+
+                if attempt > 0 and start_byte > 0 and start_byte >= file_size:
+                    # The last chunk's response was lost but the server kept every byte
+                    logger.info(f"Server already has all {file_size} bytes; nothing left to upload")
+                    logger.info("✓ Upload completed successfully!")
+                    return True
 
-                # Hybrid memory strategy: preload small files (<1.5GB), stream large files
                 file_size_gb = file_size / (1024 * 1024 * 1024)
-                use_streaming = file_size_gb > 1.5
-
-                chunks_to_upload = []
-                bytes_uploaded = start_byte
-                filename = video_path.name
-
-                if use_streaming:
-                    # Streaming mode for large files: save memory
-                    logger.info(f"Large file ({file_size_gb:.1f} GB) - using streaming mode")
-                    while bytes_uploaded < file_size:
-                        current_chunk_size = min(self.chunk_size, file_size - bytes_uploaded)
-                        chunks_to_upload.append((bytes_uploaded, current_chunk_size, None))
-                        bytes_uploaded += current_chunk_size
-                    logger.info(f"Prepared {len(chunks_to_upload)} chunks for streaming")
-                else:
-                    # Preload mode for small files: faster parallel uploads
-                    logger.info(f"Small file ({file_size_gb:.2f} GB) - preloading for speed")
-                    with open(video_path, 'rb') as f:
-                        f.seek(start_byte)
-                        file_data = f.read()
-
-                    while bytes_uploaded < file_size:
-                        current_chunk_size = min(self.chunk_size, file_size - bytes_uploaded)
-                        chunk_offset = bytes_uploaded - start_byte
-                        chunk_data = file_data[chunk_offset:chunk_offset + current_chunk_size]
-                        chunks_to_upload.append((bytes_uploaded, current_chunk_size, chunk_data))
-                        bytes_uploaded += current_chunk_size
-                    logger.info(f"Prepared {len(chunks_to_upload)} chunks from preloaded file")
-
-                # Test connectivity before starting upload
-                logger.info("Testing connectivity to upload server...")
-                try:
-                    test_response = self.upload_session.head(upload_url, timeout=15)
-                    logger.info(f"Connectivity test OK (status: {test_response.status_code})")
-                except Exception as e:
-                    logger.warning(f"Connectivity test failed: {e}")
-                    logger.warning("Proceeding anyway, but connection issues may occur")
+                is_large_file = file_size_gb > 1.5
+
+                # Chunks left at the current size (ceil division); only caps the worker count,
+                # since the size keeps adapting during the attempt
+                num_chunks = -(-(file_size - start_byte) // current_chunk_size)
+                logger.info(f"Uploading from memory-mapped file ({file_size_gb:.2f} GB)")
+
+                # Test connectivity once per upload host (this also warms the pooled connection)
+                upload_host = urlsplit(upload_url).netloc
+                if upload_host not in self._probed_hosts:
+                    logger.info("Testing connectivity to upload server...")
+                    try:
+                        test_response = self.upload_session.head(upload_url, timeout=15)
+                        logger.info(f"Connectivity test OK (status: {test_response.status_code})")
+                        self._probed_hosts.add(upload_host)
+                    except Exception as e:
+                        logger.warning(f"Connectivity test failed: {e}")
+                        logger.warning("Proceeding anyway, but connection issues may occur")
 
                 # Upload chunks with adaptive parallelism
                 # No VPN: Full speed (3 workers)
                 # With VPN + Large files (>1.5GB): 2 workers for balance
                 # With VPN + Small files (<1.5GB): 3 workers for speed
                 if self.skip_vpn:
-                    max_workers = min(3, len(chunks_to_upload))
+                    max_workers = max(1, min(self.chunk_workers, num_chunks))
                     logger.info(f"VPN disabled - using {max_workers} parallel workers for maximum speed")
-                elif use_streaming:
-                    max_workers = min(2, len(chunks_to_upload))
+                elif is_large_file:
+                    max_workers = max(1, min(2, self.chunk_workers, num_chunks))
                     logger.info(f"Large file with VPN - using {max_workers} workers for balance of speed and stability")
                 else:
-                    max_workers = min(3, len(chunks_to_upload))
+                    max_workers = max(1, min(self.chunk_workers, num_chunks))
                     logger.info(f"Small file with VPN - using {max_workers} parallel workers")
 
+                # Start traffic monitoring and timing here, so VK API calls and the
+                # status/connectivity probes are not counted as upload time
+                self.traffic_monitor.start_monitoring()
+                start_time = time.monotonic()
+
                 # Track upload progress
                 total_uploaded = start_byte
+                # Failed chunk results in a row, whichever chunks they were (a retry of the same
+                # chunk counts again); any success resets it
                 consecutive_timeouts = 0
                 max_consecutive_timeouts = 3  # Abort if 3 chunks timeout in a row
 
-                # Progress tracking for clean logging
-                last_logged_percent = 0
+                # Progress tracking for clean logging; the next log point is kept as a byte
+                # count so the per-chunk check is a single integer comparison
                 progress_log_interval = 10  # Log every 10%
-
-                try:
-                    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                        # Submit chunks in order but allow parallel execution
-                        future_to_chunk = {}
-                        for chunk_start, chunk_size_val, chunk_data in chunks_to_upload:
+                next_progress_bytes = -(-progress_log_interval * file_size // 100)  # ceil division
+                total_mb = file_size / (1024 * 1024)
+                # Recent (time, bytes) points; the rate is the slope across them, so it tracks the
+                # current speed and is not inflated by bytes resumed from an earlier attempt
+                progress_samples = deque([(start_time, total_uploaded)], maxlen=8)
+
+                executor = self._get_executor(max_workers)
+                future_to_chunk = {}  # Outstanding futures -> (chunk_start, chunk_size, chunk_view)
+                # Memory-map the file: chunks are zero-copy views and the page cache does the reading
+                with open(video_path, 'rb') as f, \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+                    if hasattr(mmap, "MADV_SEQUENTIAL"):
+                        # Chunks are read front to back: read ahead eagerly, drop pages behind
+                        file_map.madvise(mmap.MADV_SEQUENTIAL)
+                    file_view = memoryview(file_map)
+                    try:
+                        # Keep up to max_workers chunks in flight and collect them in offset order,
+                        # so each connection sends monotonically increasing ranges
+                        def submit_chunk(chunk_start: int, chunk_size_val: int):
+                            chunk_view = file_view[chunk_start:chunk_start + chunk_size_val]
                             future = executor.submit(
                                 self._upload_chunk,
                                 upload_url,
-                                video_path,
+                                chunk_view,
                                 chunk_start,
-                                chunk_size_val,
                                 file_size,
-                                filename,
-                                chunk_timeout,
-                                chunk_data  # Pass preloaded data (or None for streaming)
+                                base_headers,
+                                self._chunk_timeout(chunk_size_val)
                             )
-                            future_to_chunk[future] = (chunk_start, chunk_size_val)
-
-                        # Process results as they complete
-                        for future in as_completed(future_to_chunk):
-                            chunk_start, chunk_size_val = future_to_chunk[future]
+                            future_to_chunk[future] = (chunk_start, chunk_size_val, chunk_view)
+                            return future
+
+                        next_offset = start_byte
+                        window = deque()
+                        while next_offset < file_size or window:
+                            while next_offset < file_size and len(window) < max_workers:
+                                chunk_size_val = min(current_chunk_size, file_size - next_offset)
+                                window.append(submit_chunk(next_offset, chunk_size_val))
+                                next_offset += chunk_size_val
+
+                            # Wait for the earliest outstanding chunk
+                            future = window.popleft()
                             try:
-                                success, chunk_bytes = future.result()
+                                success, chunk_bytes, chunk_elapsed = future.result()
+                                chunk_start, chunk_size_val, chunk_view = future_to_chunk.pop(future)
+                                chunk_view.release()
                                 if not success:
                                     consecutive_timeouts += 1
-                                    logger.warning(f"Chunk upload failed ({consecutive_timeouts} consecutive failures)")
+                                    current_chunk_size = self._adapt_chunk_size(current_chunk_size, speed_ewma, failed=True)
+                                    logger.warning("Chunk upload failed (%d consecutive failures)", consecutive_timeouts)
 
                                     if consecutive_timeouts >= max_consecutive_timeouts:
                                         raise IncompleteUploadError(
-                                            f"Aborting: {consecutive_timeouts} consecutive chunk upload failures detected"
+                                            f"Aborting: {consecutive_timeouts} consecutive chunk upload failures detected",
+                                            consecutive_timeouts=True
                                         )
 
-                                    raise IncompleteUploadError(
-                                        f"Failed to upload chunk at byte {chunk_start}"
-                                    )
+                                    # Retry only this chunk, after a short jittered pause, rather than
+                                    # failing the whole attempt. Chunks already in flight keep uploading
+                                    # during the pause, but nothing is submitted or collected until the
+                                    # retry goes back in at the head of the window
+                                    retry_delay = _backoff(consecutive_timeouts, base=1)
+                                    logger.info("Retrying chunk at byte %d in %.1f seconds", chunk_start, retry_delay)
+                                    time.sleep(retry_delay)
+                                    window.appendleft(submit_chunk(chunk_start, chunk_size_val))
+                                    continue
                                 else:
                                     # Reset timeout counter on success
                                     consecutive_timeouts = 0
 
+                                    if chunk_bytes and chunk_elapsed > 0:
+                                        chunk_speed = chunk_bytes / chunk_elapsed
+                                        speed_ewma = chunk_speed if not speed_ewma else 0.7 * speed_ewma + 0.3 * chunk_speed
+                                        new_chunk_size = self._adapt_chunk_size(current_chunk_size, speed_ewma)
+                                        if new_chunk_size != current_chunk_size:
+                                            logger.debug("Chunk size -> %.0f MB", new_chunk_size / (1024 * 1024))
+                                            current_chunk_size = new_chunk_size
+
                                 # Update progress and log periodically
                                 total_uploaded += chunk_bytes
-                                current_percent = int((total_uploaded / file_size) * 100)
+                                confirmed_bytes += chunk_bytes
 
                                 # Log progress every 10%
-                                if current_percent >= last_logged_percent + progress_log_interval:
-                                    uploaded_mb = total_uploaded / (1024 * 1024)
-                                    total_mb = file_size / (1024 * 1024)
-                                    elapsed = time.time() - start_time
-                                    speed_mbps = uploaded_mb / elapsed if elapsed > 0 else 0
-                                    logger.info(f"Progress: {current_percent}% ({uploaded_mb:.0f}/{total_mb:.0f} MB) @ {speed_mbps:.1f} MB/s")
-                                    last_logged_percent = current_percent
-
+                                if total_uploaded >= next_progress_bytes:
+                                    current_percent = total_uploaded * 100 // file_size
+                                    progress_samples.append((time.monotonic(), total_uploaded))
+                                    (first_time, first_bytes), (last_time, last_bytes) = progress_samples[0], progress_samples[-1]
+                                    elapsed = last_time - first_time
+                                    speed_mbps = (last_bytes - first_bytes) / (1024 * 1024) / elapsed if elapsed > 0 else 0
+                                    logger.info("Progress: %d%% (%.0f/%.0f MB) @ %.1f MB/s",
+                                                current_percent, total_uploaded / (1024 * 1024), total_mb, speed_mbps)
+                                    next_progress_bytes = -(-(current_percent + progress_log_interval) * file_size // 100)
+
+                            except IncompleteUploadError:
+                                raise
                             except Exception as e:
                                 consecutive_timeouts += 1
                                 raise IncompleteUploadError(f"Chunk upload failed: {e}")
 
-                    logger.info(f"✓ Upload completed successfully!")
-                except Exception:
-                    raise
+                        logger.info(f"✓ Upload completed successfully!")
+                    except Exception:
+                        # Drop queued chunks so they do not run into the next attempt
+                        for future in future_to_chunk:
+                            future.cancel()
+                        raise
+                    finally:
+                        # Running chunks still read from the mapping; it can only close once they finish
+                        wait(future_to_chunk)
+                        for _, _, chunk_view in future_to_chunk.values():
+                            chunk_view.release()
+                        file_view.release()
 
                 # Log upload statistics
-                upload_time = time.time() - start_time
+                upload_time = time.monotonic() - start_time
                 network_bytes = self.traffic_monitor.get_upload_bytes()
 
                 logger.info(f"  Upload time: {upload_time:.2f} seconds ({upload_time/60:.1f} minutes)")
@@ -750,72 +1096,21 @@ class VKUploader:
 
                 return True
 
-            except VkApiError as e:
-                logger.error(f"VK API error: {e}")
-                self.last_failure_reason = f"VK API error: {e}"
-                if attempt < max_retries - 1:
-                    wait_time = 5 * (attempt + 1)  # Reduced from 10s
-                    logger.info(f"Waiting {wait_time} seconds before retry...")
-                    time.sleep(wait_time)
-                    continue
-                return False
-            except requests.Timeout as e:
-                logger.error(f"Upload timeout: {e}")
-                self.last_failure_reason = f"Upload timeout after {max_retries} attempts"
-                if attempt < max_retries - 1:
-                    wait_time = 10 * (attempt + 1)  # Reduced from 15s
-                    logger.info(f"Waiting {wait_time} seconds before retry...")
-                    time.sleep(wait_time)
-                    continue
-                return False
-            except IncompleteUploadError as e:
-                error_msg = str(e)
-                logger.error(f"Incomplete upload: {e}")
+            except Exception as e:
+                # First matching entry of RETRY_POLICY decides the message and the wait
+                _, wait_base, log_prefix, reason = next(
+                    policy for policy in self.RETRY_POLICY if isinstance(e, policy[0]))
+                logger.error(f"{log_prefix}: {e}")
+                self.last_failure_reason = reason.format(error=e, max_retries=max_retries)
+
                 # Detect consecutive timeout pattern
-                if "consecutive chunk upload failures" in error_msg:
+                if isinstance(e, IncompleteUploadError) and e.consecutive_timeouts:
                     self.last_failure_reason = "Persistent upload timeouts - VPN connection unstable or CDN unreachable"
-                    logger.error("DIAGNOSIS: Multiple consecutive timeouts detected")
-                    logger.error("This usually indicates:")
-                    logger.error("  1. WireGuard VPN connection is unstable")
-                    logger.error("  2. Current VPN server cannot reach VK CDN")
-                    logger.error("  3. VPN server is overloaded or rate-limited")
-
-                    # Try rotating WireGuard if available (only if VPN is enabled)
-                    if not self.skip_vpn and self.wg_manager and attempt < max_retries - 1:
-                        logger.info("Attempting to rotate WireGuard configuration...")
-                        next_config = self.wg_manager.get_next_config()
-                        if next_config:
-                            self.wg_manager.disconnect_wireguard()
-                            time.sleep(2)
-                            if self.wg_manager.connect_wireguard(next_config):
-                                logger.info(f"Rotated to new WireGuard config: {next_config}")
-                            else:
-                                logger.warning("Failed to connect to new WireGuard config")
-                        else:
-                            logger.warning("No alternative WireGuard configs available")
-                else:
-                    self.last_failure_reason = f"Incomplete upload: {error_msg}"
-                if attempt < max_retries - 1:
-                    wait_time = 15 * (attempt + 1)  # Longer wait for connection issues
-                    logger.info(f"Waiting {wait_time} seconds before retry...")
-                    time.sleep(wait_time)
-                    continue
-                return False
-            except requests.RequestException as e:
-                logger.error(f"Upload error: {e}")
-                self.last_failure_reason = f"Network error: {e}"
-                if attempt < max_retries - 1:
-                    wait_time = 5 * (attempt + 1)  # Reduced from 10s
-                    logger.info(f"Waiting {wait_time} seconds before retry...")
-                    time.sleep(wait_time)
-                    continue
-                return False
-            except Exception as e:
-                logger.error(f"Unexpected error during upload: {e}")
-                self.last_failure_reason = f"Unexpected error: {e}"
+                    self._handle_persistent_failures(can_retry=attempt < max_retries - 1)
+
                 if attempt < max_retries - 1:
-                    wait_time = 5 * (attempt + 1)  # Reduced from 10s
-                    logger.info(f"Waiting {wait_time} seconds before retry...")
+                    wait_time = _backoff(attempt, base=wait_base)
+                    logger.info(f"Waiting {wait_time:.1f} seconds before retry...")
                     time.sleep(wait_time)
                     continue
                 return False
@@ -824,18 +1119,37 @@ class VKUploader:
         self.last_failure_reason = f"All {max_retries} upload attempts failed"
         return False
     
-    def is_file_tagged_blue(self, file_path: Path) -> bool:
-        """Check if file has blue tag by looking for a marker file"""
-        try:
-            marker_file = file_path.with_suffix(file_path.suffix + '.uploaded')
-            return marker_file.exists()
-        except Exception:
-            return False
+    def _handle_persistent_failures(self, can_retry: bool):
+        """Log the diagnosis for repeated chunk failures and rotate WireGuard before a retry"""
+        logger.error("DIAGNOSIS: Multiple consecutive timeouts detected")
+        logger.error("This usually indicates:")
+        logger.error("  1. WireGuard VPN connection is unstable")
+        logger.error("  2. Current VPN server cannot reach VK CDN")
+        logger.error("  3. VPN server is overloaded or rate-limited")
+
+        # Try rotating WireGuard if available (only if VPN is enabled)
+        if self.skip_vpn or not self.wg_manager or not can_retry:
+            return
+        logger.info("Attempting to rotate WireGuard configuration...")
+        next_config = self.wg_manager.get_next_config()
+        if not next_config:
+            logger.warning("No alternative WireGuard configs available")
+            return
+        # The route to every upload host changes with the tunnel, so probe them again
+        self._probed_hosts.clear()
+        # connect_wireguard takes down whatever else is up itself; only the
+        # same config (a single or forced one) needs an explicit bounce
+        if next_config == self.wg_manager.current_config:
+            self.wg_manager.disconnect_wireguard()
+        if self.wg_manager.connect_wireguard(next_config):
+            logger.info(f"Rotated to new WireGuard config: {next_config}")
+        else:
+            logger.warning("Failed to connect to new WireGuard config")
 
     def mark_file_uploaded(self, video_path: Path):
         """Create a marker file to indicate video was uploaded"""
         try:
-            marker_file = video_path.with_suffix(video_path.suffix + '.uploaded')
+            marker_file = video_path.with_name(video_path.name + _UPLOADED_MARKER_SUFFIX)
             marker_file.write_text(f"Uploaded at {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
             logger.info(f"Created upload marker for {video_path.name}")
         except Exception as e:
@@ -844,16 +1158,29 @@ class VKUploader:
 def write_failure_status(video_path: Path, reason: str):
     """Write failure status to a file that can be checked by the agent"""
     status_file = Path("/app/logs/upload_failure.txt")
+    payload = (f"FAILED: {video_path.name}\n"
+               f"REASON: {reason}\n"
+               f"TIME: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
     try:
-        with open(status_file, 'w') as f:
-            f.write(f"FAILED: {video_path.name}\n")
-            f.write(f"REASON: {reason}\n")
-            f.write(f"TIME: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        # Write a temp file and rename it into place so the agent never reads a partial status
+        tmp_file = status_file.with_name(status_file.name + '.tmp')
+        tmp_file.write_text(payload)
+        os.replace(tmp_file, status_file)
         logger.info(f"Wrote failure status to {status_file}")
     except Exception as e:
         logger.warning(f"Could not write failure status: {e}")
 
 
+def _connect_next_wireguard(wg_manager: WireGuardManager):
+    """Connect the next WireGuard config in rotation, logging (not raising) on failure"""
+    next_config = wg_manager.get_next_config()
+    if next_config:
+        if not wg_manager.connect_wireguard(next_config):
+            logger.error("Failed to connect WireGuard, proceeding without VPN")
+    else:
+        logger.warning("No WireGuard configurations available")
+
+
 def main():
     """Main application logic"""
     # Get environment variables
@@ -875,27 +1202,30 @@ def main():
     uploader = VKUploader(vk_token, wg_manager=wg_manager, skip_vpn=skip_wireguard)
 
     try:
-        # Rotate WireGuard configuration (unless skipped)
-        if skip_wireguard:
-            logger.warning("WireGuard SKIPPED via SKIP_WIREGUARD env variable")
-            logger.warning("Uploading without VPN - your real IP will be exposed!")
-        else:
-            next_config = wg_manager.get_next_config()
-            if next_config:
-                if not wg_manager.connect_wireguard(next_config):
-                    logger.error("Failed to connect WireGuard, proceeding without VPN")
+        # Rotate WireGuard configuration (unless skipped) in the background while the video
+        # directory is scanned; nothing talks to VK until the tunnel attempt has finished
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="wg-connect") as wg_pool:
+            if skip_wireguard:
+                wg_future = None
+                logger.warning("WireGuard SKIPPED via SKIP_WIREGUARD env variable")
+                logger.warning("Uploading without VPN - your real IP will be exposed!")
             else:
-                logger.warning("No WireGuard configurations available")
+                wg_future = wg_pool.submit(_connect_next_wireguard, wg_manager)
+
+            # Find video file
+            video_file = uploader.find_video_file(video_dir)
+            if wg_future is not None:
+                wg_future.result()
 
-        # Find video file
-        video_file = uploader.find_video_file(video_dir)
         if not video_file:
             logger.info("No video files found to process")
             sys.exit(0)
 
-        # Determine playlist based on folder structure
-        video_dir_path = Path(video_dir).resolve()
-        video_parent = video_file.parent.resolve()
+        # Determine playlist based on folder structure. video_file was found by walking
+        # video_dir (symlinked folders are not followed), so comparing the paths lexically
+        # is exact and avoids resolve()'s readlink walk of every component
+        video_dir_path = Path(video_dir)
+        video_parent = video_file.parent
         playlist_id = None
 
         # Check if video is in a subfolder (not in root)
@@ -951,6 +1281,8 @@ def main():
         logger.error(f"Unexpected error: {e}")
         sys.exit(1)
     finally:
+        # Close pooled upload connections before the tunnel they run through goes away
+        uploader.close()
         # Cleanup - only disconnect if we connected
         if not skip_wireguard:
             wg_manager.disconnect_wireguard()